@@ -10,7 +10,7 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel, Field, HttpUrl
 from typing import List, Optional
 import os
-from ...core import doc_parser, text_processor, vector_db, llm_handler
+from ...core import doc_parser, text_processor, vector_db, llm_handler, single_flight, extractive, clause_index, hedging
 
 # ... (your existing router and RELEVANCE_THRESHOLD can stay)
 router = APIRouter()
@@ -47,6 +47,16 @@ class UploadResponse(BaseModel):
     message: str
     processed_files: List[str]
 
+def _extract_pages(filename: str, contents: bytes) -> Optional[list[str]]:
+    """Document text split by page (a single "page" for DOCX/EML), or None for unsupported types."""
+    if filename.lower().endswith('.pdf'):
+        return doc_parser.get_pages_from_pdf(contents)
+    elif filename.lower().endswith('.docx'):
+        return [doc_parser.get_text_from_docx(contents)]
+    elif filename.lower().endswith('.eml'):
+        return [doc_parser.get_text_from_eml(contents)]
+    return None
+
 @router.post("/upload", response_model=UploadResponse, tags=["Upload"])
 async def upload_files(
     files: List[UploadFile] = File(...),
@@ -103,17 +113,13 @@ async def upload_files(
             # Extract text based on file type
             try:
                 print(f"🔍 Extracting text from: {file.filename}")
-                if file.filename.lower().endswith('.pdf'):
-                    text = doc_parser.get_text_from_pdf(contents)
-                elif file.filename.lower().endswith('.docx'):
-                    text = doc_parser.get_text_from_docx(contents)
-                elif file.filename.lower().endswith('.eml'):
-                    text = doc_parser.get_text_from_eml(contents)
-                else:
+                pages = _extract_pages(file.filename, contents)
+                if pages is None:
                     raise HTTPException(
                         status_code=400,
                         detail=f"Unsupported file type: {file.filename}"
                     )
+                text = "".join(pages)
                 print(f"✅ Text extracted successfully: {len(text)} characters")
             except Exception as e:
                 print(f"❌ Text extraction failed for {file.filename}: {str(e)}")
@@ -132,14 +138,24 @@ async def upload_files(
             # Process and store text
             try:
                 print(f"📦 Chunking text for: {file.filename}")
-                chunks = text_processor.chunk_text(text)
+                chunks_with_offsets = text_processor.chunk_text_with_offsets(text)
+                chunks = [chunk for chunk, _ in chunks_with_offsets]
                 print(f"✅ Created {len(chunks)} chunks")
                 
                 if chunks:
+                    doc_index = await asyncio.to_thread(
+                        clause_index.build_document_index,
+                        pages, file.filename, paginated=file.filename.lower().endswith('.pdf')
+                    )
+                    clause_index.add_document(chat_id, doc_index)
+                    print(f"🗂️ Indexed {len(doc_index['clauses'])} clauses for: {file.filename}")
                     print(f"🔗 Storing in vector database...")
                     backend_result = vector_db.add_texts(
                         texts=chunks,
-                        metadatas=[{"source": file.filename, "chat_id": chat_id}] * len(chunks),
+                        metadatas=[
+                            {"source": file.filename, "chat_id": chat_id, **clause_index.chunk_metadata(doc_index, start, len(chunk))}
+                            for chunk, start in chunks_with_offsets
+                        ],
                         namespace=chat_id
                     )
                     processed_files.append(f"{file.filename} ({backend_result['backend']})")
@@ -178,6 +194,111 @@ async def upload_files(
         print(f"💥 Upload error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
+async def _answer_query(query: str, chat_id: str) -> dict:
+    """
+    Retrieval + structured LLM analysis for a chat query. Blocking calls run in
+    worker threads so concurrent requests don't stall the event loop.
+    """
+    # Query the vector store within the chat namespace
+    context_chunks_with_scores = await asyncio.to_thread(
+        vector_db.query_vectors_with_scores, query, top_k=8, namespace=chat_id
+    )
+    
+    if not context_chunks_with_scores:
+        return {
+            "conversational_answer": "I couldn't find relevant information in your uploaded documents to answer this question. Please make sure you've uploaded the relevant policy or claim documents."
+        }
+    
+    # Filter by relevance threshold
+    relevant_chunks = [
+        (doc, score) for doc, score in context_chunks_with_scores
+        if score >= RELEVANCE_THRESHOLD
+    ]
+    relevant_docs = [doc.page_content for doc, _ in relevant_chunks]
+    
+    if not relevant_docs:
+        return {
+            "conversational_answer": "The uploaded documents don't seem to contain relevant information for your question. Could you try rephrasing your question or upload more specific documents?"
+        }
+    
+    context = "\n---\n".join(relevant_docs)
+    
+    # Simple lookups answered straight from the retrieved text skip the LLM round trip
+    fast_answer = extractive.try_fast_answer(query, relevant_docs)
+    if fast_answer is not None:
+        source_doc, _ = relevant_chunks[fast_answer.chunk_index]
+        source = source_doc.metadata.get("source", "unknown")
+        indexed = clause_index.resolve_clause(chat_id, fast_answer.answer, source) or {}
+        return {
+            "conversational_answer": fast_answer.answer,
+            "justification": f"Taken directly from {source_doc.metadata.get('source', 'the uploaded document')}: \"{fast_answer.answer}\"",
+            "supporting_clauses": [
+                {
+                    "clause_id": indexed.get("clause_id", ""),
+                    "clause_text": fast_answer.answer,
+                    "source_document": source,
+                    "relevance_score": fast_answer.confidence,
+                    "page_number": indexed.get("page", source_doc.metadata.get("page_number"))
+                }
+            ]
+        }
+    
+    # Use the enhanced LLM pipeline for structured analysis
+    try:
+        # Extract entities from the query
+        entities = await llm_handler.extract_entities_from_query(query)
+        
+        # Format context for the reasoning pipeline
+        context_dict = [
+            {
+                "content": doc.page_content,
+                "source": doc.metadata.get("source", "unknown"),
+                "page_number": doc.metadata.get("page_number"),
+                "clause_ids": doc.metadata.get("clause_ids", []),
+                "score": score
+            }
+            for doc, score in relevant_chunks
+        ]
+        # Clause numbers, headings and precomputed limits built at upload time
+        policy_index = clause_index.format_for_prompt(clause_index.lookup(chat_id, query))
+        
+        # Run the full reasoning pipeline
+        response = await llm_handler.run_reasoning_pipeline(entities, context_dict, query, policy_index)
+        
+        # Replace guessed clause ids / page numbers with the indexed ones
+        for clause in response.supporting_clauses or []:
+            indexed = clause_index.resolve_clause(chat_id, clause.clause_text, clause.source_document)
+            if indexed is not None:
+                clause.clause_id = indexed["clause_id"]
+                clause.page_number = indexed["page"]
+        
+        # Format response
+        return {
+            "conversational_answer": response.conversational_answer,
+            "topic": response.topic,
+            "decision": response.decision,
+            "justification": response.justification,
+            "calculation_explanation": response.calculation_explanation,
+            "supporting_clauses": [
+                {
+                    "clause_id": clause.clause_id,
+                    "clause_text": clause.clause_text,
+                    "source_document": clause.source_document,
+                    "relevance_score": getattr(clause, 'relevance_score', None),
+                    "page_number": getattr(clause, 'page_number', None)
+                }
+                for clause in response.supporting_clauses
+            ] if response.supporting_clauses else []
+        }
+        
+    except Exception as llm_error:
+        # Fallback to simple LLM response if structured analysis fails
+        print(f"LLM pipeline error: {llm_error}")
+        answer = await llm_handler.get_direct_answer(query, context)
+        return {
+            "conversational_answer": answer
+        }
+
 @router.post("/query", response_model=QueryResponse, tags=["Query"])
 async def query_documents(
     query: str = Form(...),
@@ -194,73 +315,11 @@ async def query_documents(
         except json.JSONDecodeError:
             messages = []
         
-        # Query the vector store within the chat namespace
-        context_chunks_with_scores = vector_db.query_vectors_with_scores(
-            query, top_k=8, namespace=chat_id
-        )
-        
-        if not context_chunks_with_scores:
-            return QueryResponse(
-                conversational_answer="I couldn't find relevant information in your uploaded documents to answer this question. Please make sure you've uploaded the relevant policy or claim documents."
-            )
-        
-        # Filter by relevance threshold
-        relevant_docs = [
-            doc.page_content for doc, score in context_chunks_with_scores 
-            if score >= RELEVANCE_THRESHOLD
-        ]
-        
-        if not relevant_docs:
-            return QueryResponse(
-                conversational_answer="The uploaded documents don't seem to contain relevant information for your question. Could you try rephrasing your question or upload more specific documents?"
-            )
-        
-        context = "\n---\n".join(relevant_docs)
-        
-        # Use the enhanced LLM pipeline for structured analysis
-        try:
-            # Extract entities from the query
-            entities = llm_handler.extract_entities_from_query(query)
-            
-            # Format context for the reasoning pipeline
-            context_dict = [
-                {
-                    "content": doc.page_content,
-                    "source": doc.metadata.get("source", "unknown"),
-                    "score": score
-                }
-                for doc, score in context_chunks_with_scores if score >= RELEVANCE_THRESHOLD
-            ]
-            
-            # Run the full reasoning pipeline
-            response = llm_handler.run_reasoning_pipeline(entities, context_dict, query)
-            
-            # Format response
-            response_data = {
-                "conversational_answer": response.conversational_answer,
-                "topic": response.topic,
-                "decision": response.decision,
-                "justification": response.justification,
-                "calculation_explanation": response.calculation_explanation,
-                "supporting_clauses": [
-                    {
-                        "clause_id": clause.clause_id,
-                        "clause_text": clause.clause_text,
-                        "source_document": clause.source_document,
-                        "relevance_score": getattr(clause, 'relevance_score', None),
-                        "page_number": getattr(clause, 'page_number', None)
-                    }
-                    for clause in response.supporting_clauses
-                ] if response.supporting_clauses else []
-            }
-            
-        except Exception as llm_error:
-            # Fallback to simple LLM response if structured analysis fails
-            print(f"LLM pipeline error: {llm_error}")
-            answer = await llm_handler.get_direct_answer(query, context)
-            response_data = {
-                "conversational_answer": answer
-            }
+        # Concurrent duplicates of the same question against the same document set share one answer
+        flight_key = (chat_id, vector_db.namespace_version(chat_id), single_flight.normalize_question(query))
+        response_data = dict(await single_flight.question_flight.do(
+            flight_key, lambda: _answer_query(query, chat_id)
+        ))
         
         # Generate chat title for new conversations
         if len(messages) <= 2:  # First user message
@@ -275,6 +334,89 @@ async def query_documents(
         print(f"Query error: {e}")
         raise HTTPException(status_code=500, detail=f"Query failed: {str(e)}")
 
+# --- Shared document ingestion for the hackathon endpoint ---
+# Concurrent runs for the same document share one download/parse/embed and one namespace.
+# The namespace lives until the last run holding it finishes.
+# Refcounts are per process, so namespaces carry a process id: another worker or instance
+# sharing the Pinecone index never reads, duplicates or deletes this process's vectors.
+_PROCESS_ID = uuid.uuid4().hex[:12]
+_document_refs: dict[str, int] = {}
+_ready_documents: dict[str, str] = {}  # document key -> namespace
+# document key -> background work still changing its namespace (a write the cancelled run
+# started, the cleanup delete); a new ingest waits for it instead of writing alongside it
+_settling: dict[str, asyncio.Future] = {}
+
+def _document_namespace(doc_key: str) -> str:
+    return f"hackrx-{_PROCESS_ID}-{doc_key}"
+
+def _delete_document_namespace(namespace: str):
+    # IMPORTANT: Clean up the namespace in Pinecone to ensure statelessness
+    print(f"Cleaning up namespace: {namespace}")
+    vector_db.delete_namespace(namespace)
+    clause_index.delete_index(namespace)
+
+def _track_settling(doc_key: str, work) -> asyncio.Future:
+    task = asyncio.ensure_future(work)
+    _settling[doc_key] = task
+    task.add_done_callback(lambda t: _settling.pop(doc_key) if _settling.get(doc_key) is t else None)
+    return task
+
+def _download_and_chunk(document_url: str) -> tuple[str, dict, list[tuple[str, int]]]:
+    # 2. Input Documents: Download the file from the URL
+    response = requests.get(document_url)
+    response.raise_for_status() # Raise an exception for bad status codes
+    contents = response.content
+    filename = os.path.basename(document_url.split('?')[0]) # Get a clean filename
+
+    # 3. LLM Parser (File Content Extraction)
+    pages = _extract_pages(filename, contents)
+    if pages is None:
+        raise HTTPException(status_code=400, detail=f"Unsupported file type from URL: {filename}")
+
+    # 4. Chunking
+    chunks_with_offsets = text_processor.chunk_text_with_offsets("".join(pages))
+    if not chunks_with_offsets:
+        raise HTTPException(status_code=400, detail="Could not extract any text from the document.")
+
+    # 4b. Clause / entity index (regex work over the whole document, so it stays off the event loop)
+    doc_index = clause_index.build_document_index(pages, filename, paginated=filename.lower().endswith(".pdf"))
+    return filename, doc_index, chunks_with_offsets
+
+async def _ingest_document(document_url: str, doc_key: str, namespace: str) -> str:
+    # A cancelled run's write may still be landing; its cleanup deletes the namespace once
+    # it has, and only then is the document ingested again.
+    while (settling := _settling.get(doc_key)) is not None and not settling.done():
+        await asyncio.wait({settling})
+    filename, doc_index, chunks_with_offsets = await asyncio.to_thread(_download_and_chunk, document_url)
+    clause_index.add_document(namespace, doc_index)
+    # The worker thread can't be interrupted; tracked so a cancelled run's cleanup waits for it
+    write = _track_settling(doc_key, asyncio.to_thread(
+        vector_db.add_texts,
+        texts=[chunk for chunk, _ in chunks_with_offsets],
+        metadatas=[
+            {"source": filename, **clause_index.chunk_metadata(doc_index, start, len(chunk))}
+            for chunk, start in chunks_with_offsets
+        ],
+        namespace=namespace
+    ))
+    await asyncio.shield(write)
+    _ready_documents[doc_key] = namespace
+    return namespace
+
+async def _release_document(doc_key: str):
+    _document_refs[doc_key] -= 1
+    if _document_refs[doc_key] > 0:
+        return
+    del _document_refs[doc_key]
+    _ready_documents.pop(doc_key, None)
+    pending = _settling.get(doc_key)
+
+    async def cleanup():
+        if pending is not None:
+            await asyncio.wait({pending})
+        await asyncio.to_thread(_delete_document_namespace, _document_namespace(doc_key))
+    await asyncio.shield(_track_settling(doc_key, cleanup()))
+
 # --- NEW HACKATHON ENDPOINT ---
 @router.post("/hackrx/run", 
              response_model=HackRxResponse,
@@ -285,43 +427,24 @@ async def hackrx_run_submission(payload: HackRxRequest):
     Processes a single document from a URL and answers a list of questions about it.
     This is a stateless endpoint designed for the hackathon's evaluation.
     """
-    # 1. Generate a unique ID for this request to use as a Pinecone namespace
-    request_namespace = str(uuid.uuid4())
+    # 1. Key the document by hash; concurrent runs for the same document share its namespace
+    document_url = str(payload.documents)
+    doc_key = single_flight.document_key(document_url)
+    request_namespace = _document_namespace(doc_key)
+    _document_refs[doc_key] = _document_refs.get(doc_key, 0) + 1
     
     try:
-        # 2. Input Documents: Download the file from the URL
-        response = requests.get(str(payload.documents))
-        response.raise_for_status() # Raise an exception for bad status codes
-        contents = response.content
-        filename = os.path.basename(str(payload.documents).split('?')[0]) # Get a clean filename
-
-        # 3. LLM Parser (File Content Extraction)
-        if filename.lower().endswith(".pdf"):
-            text = doc_parser.get_text_from_pdf(contents)
-        elif filename.lower().endswith(".docx"):
-            text = doc_parser.get_text_from_docx(contents)
-        elif filename.lower().endswith(".eml"):
-            text = doc_parser.get_text_from_eml(contents)
-        else:
-            raise HTTPException(status_code=400, detail=f"Unsupported file type from URL: {filename}")
-
-        # 4. Chunking & Embedding
-        chunks = text_processor.chunk_text(text)
-        if not chunks:
-            raise HTTPException(status_code=400, detail="Could not extract any text from the document.")
-
-        store = vector_db.get_vector_store()
-        store.add_texts(
-            texts=chunks,
-            metadatas=[{"source": filename}] * len(chunks),
-            namespace=request_namespace # Use the unique namespace
-        )
+        if doc_key not in _ready_documents:
+            await single_flight.document_flight.do(
+                doc_key, lambda: _ingest_document(document_url, doc_key, request_namespace)
+            )
+        namespace_version = vector_db.namespace_version(request_namespace)
 
         # 5. Process all questions in parallel for efficiency (addresses Latency)
-        async def process_question(question: str):
+        async def answer_question(question: str):
             # 5a. Embedding Search & Clause Matching
-            context_chunks_with_scores = vector_db.query_vectors_with_scores(
-                question, top_k=5, namespace=request_namespace
+            context_chunks_with_scores = await asyncio.to_thread(
+                vector_db.query_vectors_with_scores, question, top_k=5, namespace=request_namespace
             )
             
             relevant_docs = [doc.page_content for doc, score in context_chunks_with_scores if score > RELEVANCE_THRESHOLD]
@@ -329,12 +452,23 @@ async def hackrx_run_submission(payload: HackRxRequest):
             if not relevant_docs:
                 return "I could not find relevant information in the document to answer this question."
 
+            fast_answer = extractive.try_fast_answer(question, relevant_docs)
+            if fast_answer is not None:
+                return fast_answer.answer
+
             context = "\n---\n".join(relevant_docs)
+            key_facts = clause_index.format_for_prompt(clause_index.lookup(request_namespace, question))
+            if key_facts:
+                context = f"Indexed policy facts:\n{key_facts}\n---\n{context}"
             
             # 5b. Logic Evaluation
             answer = await llm_handler.get_direct_answer(question, context)
             return answer
 
+        async def process_question(question: str):
+            flight_key = (request_namespace, namespace_version, single_flight.normalize_question(question))
+            return await single_flight.question_flight.do(flight_key, lambda: answer_question(question))
+
         # Run all question processing tasks concurrently
         tasks = [process_question(q) for q in payload.questions]
         answers = await asyncio.gather(*tasks)
@@ -342,6 +476,8 @@ async def hackrx_run_submission(payload: HackRxRequest):
         # 6. JSON Output
         return HackRxResponse(answers=answers)
 
+    except HTTPException:
+        raise
     except requests.exceptions.RequestException as e:
         raise HTTPException(status_code=400, detail=f"Failed to download document from URL: {e}")
     except Exception as e:
@@ -349,6 +485,25 @@ async def hackrx_run_submission(payload: HackRxRequest):
         print(f"An unexpected error occurred: {e}")
         raise HTTPException(status_code=500, detail=f"An internal error occurred: {e}")
     finally:
-        # IMPORTANT: Clean up the namespace in Pinecone to ensure statelessness
-        print(f"Cleaning up namespace: {request_namespace}")
-        vector_db.delete_namespace(request_namespace)
\ No newline at end of file
+        await _release_document(doc_key)
+
+@router.get("/status", tags=["Health Check"])
+async def service_status():
+    """
+    Runtime counters for the vector backend, request coalescing, the extractive fast path,
+    clause indexes and LLM hedging. Only aggregate counts: namespaces are chat ids, and a
+    chat id is all /query needs to read that chat's documents.
+    """
+    vector_state = vector_db.backend_status()
+    vector_state["local_namespaces"] = len(vector_state["local_namespaces"])
+    vector_state["pending_replay"] = {
+        "namespaces": len(vector_state["pending_replay"]),
+        "operations": sum(vector_state["pending_replay"].values()),
+    }
+    return {
+        "vector_db": vector_state,
+        "coalescing": single_flight.coalescing_status(),
+        "extractive": extractive.extractive_status(),
+        "clause_index": clause_index.index_status(),
+        "llm_hedging": hedging.hedging_status(),
+    }
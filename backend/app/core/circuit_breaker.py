@@ -0,0 +1,83 @@
+import threading
+import time
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Closed -> open after `failure_threshold` consecutive failures. Once open for
+    `recovery_timeout` seconds, a single trial call (half-open) is let through:
+    success closes the circuit, failure re-opens it. Thread-safe.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 3, recovery_timeout: float = 30.0, clock=time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._on_close = []
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.times_opened = 0
+        self.last_error = None
+
+    def on_close(self, callback):
+        """Register a callback run (outside the lock) whenever the circuit recovers."""
+        self._on_close.append(callback)
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and self._clock() - self.opened_at >= self.recovery_timeout:
+                self.state = HALF_OPEN
+                print(f"[circuit:{self.name}] Half-open, trying one request.")
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            recovered = self.state != CLOSED
+            self.state = CLOSED
+            self.failures = 0
+            self.opened_at = None
+        if recovered:
+            print(f"[circuit:{self.name}] Closed, remote backend recovered.")
+            for callback in self._on_close:
+                callback()
+
+    def record_failure(self, error: Exception = None):
+        with self._lock:
+            self.last_error = str(error) if error else None
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    self.times_opened += 1
+                    print(f"[circuit:{self.name}] Open after {self.failures} failure(s): {error}")
+                self.state = OPEN
+                self.opened_at = self._clock()
+
+    def force_open(self, error: Exception = None):
+        with self._lock:
+            self.failures = max(self.failures, self.failure_threshold)
+        self.record_failure(error)
+
+    def seconds_until_retry(self) -> float:
+        with self._lock:
+            if self.state != OPEN:
+                return 0.0
+            return max(0.0, self.recovery_timeout - (self._clock() - self.opened_at))
+
+    def status(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "times_opened": self.times_opened,
+            "retry_in_seconds": round(self.seconds_until_retry(), 1),
+            "last_error": self.last_error,
+        }
@@ -0,0 +1,240 @@
+import bisect
+import os
+import re
+import threading
+from collections import OrderedDict, defaultdict
+from typing import Optional
+from .extractive import PATTERNS, content_tokens
+from .text_processor import split_sentences
+
+# Numbered clause / section headings, e.g. "4.1 Waiting Period", "Section 3 Exclusions",
+# "Clause 2.3: Room Rent", "2. Definitions". A bare number needs a "." / ")" / ":" and the
+# title must be capitalised, so wrapped lines like "36 months of cover" are not clauses.
+_CLAUSE_HEADING = re.compile(
+    r"^[ \t]*(?:(?i:clause|section|article)[ \t]+(\d{1,2}(?:\.\d{1,3}){0,3})[.):]?"
+    r"|(\d{1,2}(?:\.\d{1,3})+)[.):]?"
+    r"|(\d{1,2})[.):])"
+    r"[ \t]+([A-Z][^\n]{2,150})$",
+    re.MULTILINE,
+)
+# Un-numbered headings in capitals, e.g. "EXCLUSIONS", "GENERAL CONDITIONS"
+_CAPS_HEADING = re.compile(r"^[ \t]*([A-Z][A-Z &/,()-]{3,80})[ \t]*$", re.MULTILINE)
+_LIMIT_CUES = re.compile(r"\b(limit|maximum|max\.?|up to|upto|capped|not exceed|sum insured|sub-?limit)\b", re.IGNORECASE)
+_WAITING_CUES = re.compile(
+    r"\b(waiting period|wait|grace period|moratorium|cooling|continuous coverage|excluded until)\b", re.IGNORECASE
+)
+
+# Per-namespace structured index: namespace -> {"clauses": {id: {...}}, "headings": [...], "limits": [...], ...}
+# Held in process memory only and built at upload time: after a restart, namespaces whose
+# vectors are still in Pinecone have no index until their files are uploaded again.
+# Least recently used namespaces are evicted beyond CLAUSE_INDEX_MAX_NAMESPACES.
+CLAUSE_INDEX_MAX_NAMESPACES = int(os.getenv("CLAUSE_INDEX_MAX_NAMESPACES", "500"))
+_indexes: "OrderedDict[str, dict]" = OrderedDict()
+_lock = threading.Lock()
+_stats = {"evicted": 0, "lookups_without_index": 0}
+
+_FACT_KEYS = ("headings", "limits", "percentages", "waiting_periods")
+
+
+def _page_at(page_starts: list[int], offset: int) -> Optional[int]:
+    if not page_starts:
+        return None
+    return bisect.bisect_right(page_starts, offset)
+
+
+def build_document_index(pages: list[str], source: str, paginated: bool = True) -> dict:
+    """
+    Structured lookups for one document: numbered clauses with their text span, section
+    headings, monetary limits, percentages and waiting periods, each with its page number.
+    `pages` joined with "" must equal the text that was chunked so offsets line up.
+    """
+    text = "".join(pages)
+    page_starts = []
+    if paginated:
+        position = 0
+        for page in pages:
+            page_starts.append(position)
+            position += len(page)
+
+    headings = []
+    clause_starts = []
+    for match in _CLAUSE_HEADING.finditer(text):
+        clause_id = match.group(1) or match.group(2) or match.group(3)
+        clause_starts.append((match.start(), clause_id, match.group(4).strip()))
+    for match in _CAPS_HEADING.finditer(text):
+        headings.append({
+            "heading": match.group(1).strip(),
+            "page": _page_at(page_starts, match.start()),
+            "source": source,
+        })
+
+    clauses = {}
+    for i, (start, clause_id, heading) in enumerate(clause_starts):
+        end = clause_starts[i + 1][0] if i + 1 < len(clause_starts) else len(text)
+        if clause_id in clauses:
+            # Tables of contents repeat the numbering; keep the occurrence with the longer body
+            if end - start <= clauses[clause_id]["end"] - clauses[clause_id]["start"]:
+                continue
+        clauses[clause_id] = {
+            "clause_id": clause_id,
+            "heading": heading,
+            "text": " ".join(text[start:end].split()),
+            "page": _page_at(page_starts, start),
+            "source": source,
+            "start": start,
+            "end": end,
+        }
+        headings.append({"heading": f"{clause_id} {heading}", "page": _page_at(page_starts, start), "source": source})
+    spans = sorted((c["start"], c["end"], c["clause_id"]) for c in clauses.values())
+
+    def clause_at(offset: int) -> Optional[str]:
+        for start, end, clause_id in spans:
+            if start <= offset < end:
+                return clause_id
+        return None
+
+    facts = {"limits": [], "percentages": [], "waiting_periods": []}
+    for start, sentence in split_sentences(text):
+        # Drop a heading line that leads into the sentence body
+        heading = _CLAUSE_HEADING.match(sentence) or _CAPS_HEADING.match(sentence)
+        if heading and heading.end() < len(sentence.rstrip()):
+            start += heading.end()
+            sentence = sentence[heading.end():]
+        sentence = " ".join(sentence.split())
+        if len(sentence) < 15:
+            continue
+        location = {
+            "text": sentence,
+            "page": _page_at(page_starts, start),
+            "clause_id": clause_at(start),
+            "source": source,
+        }
+        amount = PATTERNS["amount"].search(sentence)
+        if amount and _LIMIT_CUES.search(sentence):
+            facts["limits"].append({"value": amount.group(0), **location})
+        percentage = PATTERNS["percentage"].search(sentence)
+        if percentage:
+            facts["percentages"].append({"value": percentage.group(0), **location})
+        duration = PATTERNS["duration"].search(sentence)
+        if duration and _WAITING_CUES.search(sentence):
+            facts["waiting_periods"].append({"value": duration.group(0), **location})
+
+    headings.sort(key=lambda h: (h["page"] or 0))
+    return {"source": source, "clauses": clauses, "headings": headings, "page_starts": page_starts, "_spans": spans, **facts}
+
+
+def chunk_metadata(doc_index: dict, start: int, length: int) -> dict:
+    """Page number and clause ids covered by a chunk; keys are omitted when unknown (Pinecone rejects nulls)."""
+    metadata = {}
+    page = _page_at(doc_index["page_starts"], start)
+    if page is not None:
+        metadata["page_number"] = page
+    end = start + length
+    clause_ids = [cid for s, e, cid in doc_index["_spans"] if s < end and e > start]
+    if clause_ids:
+        metadata["clause_ids"] = clause_ids
+    return metadata
+
+
+def add_document(namespace: str, doc_index: dict):
+    """Add a document's entries to a namespace, replacing any earlier entries for the same source."""
+    source = doc_index["source"]
+    with _lock:
+        index = _indexes.get(namespace)
+        if index is None:
+            index = _indexes[namespace] = defaultdict(list, clauses={})
+        _indexes.move_to_end(namespace)
+        index["clauses"] = {key: c for key, c in index["clauses"].items() if c["source"] != source}
+        for clause_id, clause in doc_index["clauses"].items():
+            index["clauses"][f"{clause['source']}#{clause_id}"] = clause
+        for key in _FACT_KEYS:
+            index[key] = [entry for entry in index[key] if entry["source"] != source] + doc_index[key]
+        while len(_indexes) > CLAUSE_INDEX_MAX_NAMESPACES:
+            _indexes.popitem(last=False)
+            _stats["evicted"] += 1
+            print(f"[clause_index] Evicted least recently used index ({len(_indexes)} namespaces kept).")
+
+
+def get_index(namespace: str) -> Optional[dict]:
+    with _lock:
+        index = _indexes.get(namespace)
+        if index is not None:
+            _indexes.move_to_end(namespace)
+        return index
+
+
+def delete_index(namespace: str):
+    with _lock:
+        _indexes.pop(namespace, None)
+
+
+def _rank(items: list[dict], q_tokens: set, text_key: str, limit: int) -> list[dict]:
+    scored = []
+    for item in items:
+        overlap = len(q_tokens & content_tokens(item[text_key]))
+        if overlap:
+            scored.append((overlap, item))
+    scored.sort(key=lambda pair: pair[0], reverse=True)
+    return [item for _, item in scored[:limit]]
+
+
+def lookup(namespace: str, query: str, limit: int = 5) -> dict:
+    """Index entries relevant to a query (by keyword overlap), without offsets."""
+    index = get_index(namespace)
+    if not index:
+        # Evicted, never built in this process (e.g. after a restart) or no document yet
+        _stats["lookups_without_index"] += 1
+        return {}
+    q_tokens = content_tokens(query)
+    clauses = _rank(
+        [{**c, "match": f"{c['heading']} {c['text'][:300]}"} for c in index["clauses"].values()],
+        q_tokens, "match", limit,
+    )
+    return {
+        "clauses": [
+            {"clause_id": c["clause_id"], "heading": c["heading"], "page": c["page"], "source": c["source"]}
+            for c in clauses
+        ],
+        "limits": _rank(index["limits"], q_tokens, "text", limit),
+        "percentages": _rank(index["percentages"], q_tokens, "text", limit),
+        "waiting_periods": _rank(index["waiting_periods"], q_tokens, "text", limit),
+    }
+
+
+def format_for_prompt(entries: dict) -> str:
+    """Compact one-line-per-entry rendering of a lookup() result."""
+    lines = []
+    for clause in entries.get("clauses", []):
+        lines.append(f"[clause {clause['clause_id']}] {clause['heading']} (page {clause['page']}, {clause['source']})")
+    for key, label in (("limits", "limit"), ("percentages", "percentage"), ("waiting_periods", "waiting period")):
+        for fact in entries.get(key, []):
+            where = f"clause {fact['clause_id']}, " if fact["clause_id"] else ""
+            lines.append(f"[{label}] {fact['value']} — {fact['text']} ({where}page {fact['page']}, {fact['source']})")
+    return "\n".join(lines)
+
+
+def resolve_clause(namespace: str, clause_text: str, source: str = None) -> Optional[dict]:
+    """Best-matching indexed clause for a quoted clause text, used to correct clause ids and pages."""
+    index = get_index(namespace)
+    if not index or not clause_text:
+        return None
+    needle = " ".join(clause_text.split()).lower()
+    candidates = [c for c in index["clauses"].values() if source is None or c["source"] == source] or list(index["clauses"].values())
+    for clause in candidates:
+        if needle[:200] in clause["text"].lower():
+            return clause
+    q_tokens = content_tokens(clause_text)
+    best = _rank([{**c, "match": c["text"]} for c in candidates], q_tokens, "match", 1)
+    if best and len(q_tokens & content_tokens(best[0]["text"])) >= max(3, len(q_tokens) // 2):
+        return best[0]
+    return None
+
+
+def index_status() -> dict:
+    """Totals across namespaces (namespace names are chat ids and are not exposed)."""
+    with _lock:
+        indexes = list(_indexes.values())
+    totals = {"namespaces": len(indexes), "max_namespaces": CLAUSE_INDEX_MAX_NAMESPACES, **_stats}
+    for key in ("clauses",) + _FACT_KEYS:
+        totals[key] = sum(len(index[key]) for index in indexes)
+    return totals
@@ -6,14 +6,16 @@ import docx
 import email
 from email.policy import default
 
-def get_text_from_pdf(pdf_contents: bytes) -> str:
-    # ... (no changes)
-    text = ""
+def get_pages_from_pdf(pdf_contents: bytes) -> list[str]:
+    """
+    Extracts the text of each page separately so page numbers can be recovered later.
+    """
     pdf_file = io.BytesIO(pdf_contents)
     pdf_reader = PyPDF2.PdfReader(pdf_file)
-    for page in pdf_reader.pages:
-        text += page.extract_text() or ""
-    return text
+    return [page.extract_text() or "" for page in pdf_reader.pages]
+
+def get_text_from_pdf(pdf_contents: bytes) -> str:
+    return "".join(get_pages_from_pdf(pdf_contents))
 
 def get_text_from_docx(docx_contents: bytes) -> str:
     # ... (no changes)
@@ -0,0 +1,159 @@
+import os
+import re
+from typing import List, Optional
+from pydantic import BaseModel
+from .text_processor import split_sentences
+
+# Answers scoring at or above this are returned without an LLM call (set > 1 to disable).
+EXTRACTIVE_CONFIDENCE_THRESHOLD = float(os.getenv("EXTRACTIVE_CONFIDENCE_THRESHOLD", "0.75"))
+
+_NUMBER_WORDS = r"one|two|three|four|five|six|seven|eight|nine|ten|eleven|twelve|fifteen|eighteen|twenty|twenty[- ]four|thirty|thirty[- ]six|forty[- ]eight|sixty|ninety"
+
+PATTERNS = {
+    "duration": re.compile(
+        rf"\b(?:\d+|{_NUMBER_WORDS})\s*(?:\(\s*\d+\s*\)\s*)?(?:continuous\s+|consecutive\s+)?(?:days?|months?|years?|hours?)\b",
+        re.IGNORECASE,
+    ),
+    "percentage": re.compile(r"\b\d+(?:\.\d+)?\s*(?:%|per\s*cent\b|percent\b)", re.IGNORECASE),
+    "amount": re.compile(
+        r"(?:(?:rs\.?|inr|₹|\$|usd)\s*[\d,]+(?:\.\d+)?(?:\s*(?:lakhs?|crores?|thousand|million))?"
+        r"|\b[\d,]+(?:\.\d+)?\s*(?:lakhs?|crores?|rupees))",
+        re.IGNORECASE,
+    ),
+}
+
+# Question cues -> the kind of value a lookup answer must contain.
+_TYPE_CUES = [
+    ("percentage", re.compile(r"\b(percent|percentage|%|co-?pay(ment)?|discount|rate)\b", re.IGNORECASE)),
+    ("duration", re.compile(r"\b(period|how long|duration|days?|months?|years?|tenure|term)\b", re.IGNORECASE)),
+    ("amount", re.compile(r"\b(limit|amount|sum insured|how much|cap|maximum|minimum|sub-?limit|premium)\b", re.IGNORECASE)),
+]
+
+# Words that name the kind of value rather than what it is about ("waiting period" of what?)
+_VALUE_WORDS = {"waiting", "specific", "applicable"}
+
+_LOOKUP_START = re.compile(r"^\s*(what|how|is there|are there|does|do|is|are|which|when)\b", re.IGNORECASE)
+
+_STOPWORDS = {
+    "a", "an", "the", "of", "for", "to", "in", "on", "and", "or", "is", "are", "was", "be", "by", "with",
+    "what", "which", "how", "when", "does", "do", "there", "this", "that", "any", "under", "policy",
+    "long", "much", "many", "it", "as", "at", "from", "my", "i", "me", "can", "will", "if",
+}
+
+# Fast path counters, surfaced on /api/v1/status
+_stats = {"attempts": 0, "answered": 0, "fell_through": 0, "skipped": 0}
+
+
+class ExtractiveAnswer(BaseModel):
+    answer: str
+    value: str
+    value_type: str
+    confidence: float
+    chunk_index: int
+    # Another near-equal candidate has a different value; never answered without the LLM
+    ambiguous: bool = False
+
+
+def content_tokens(text: str) -> set:
+    words = re.findall(r"[a-z0-9]+(?:-[a-z0-9]+)?", text.lower())
+    return {w[:-1] if len(w) > 3 and w.endswith("s") else w for w in words if w not in _STOPWORDS}
+
+
+def expected_value_type(question: str) -> Optional[str]:
+    """The value type a simple lookup question asks for, or None if it isn't one."""
+    if not _LOOKUP_START.match(question):
+        return None
+    # Claim submissions carry their own figures and need the full reasoning pipeline
+    if PATTERNS["amount"].search(question) or re.search(r"\b(i|my|we)\b.*\b(had|paid|claim|cost)", question, re.IGNORECASE):
+        return None
+    for value_type, cue in _TYPE_CUES:
+        if cue.search(question):
+            return value_type
+    return None
+
+
+def extract_answer(question: str, chunks: List[str]) -> Optional[ExtractiveAnswer]:
+    """
+    Score the sentences of the retrieved chunks against the question and pull out the
+    duration / percentage / amount it asks for. Returns the best candidate (with its
+    confidence) or None when the question isn't a simple lookup.
+    """
+    value_type = expected_value_type(question)
+    if value_type is None:
+        return None
+    q_tokens = content_tokens(question)
+    if not q_tokens:
+        return None
+    # Score on what the question is about; the value-type words ("waiting", "period",
+    # "limit") match almost any candidate sentence and say nothing about relevance.
+    cue_tokens = set(_VALUE_WORDS)
+    for _, cue in _TYPE_CUES:
+        for match in cue.finditer(question):
+            cue_tokens |= content_tokens(match.group(0))
+    subject_tokens = q_tokens - cue_tokens
+    generic = not subject_tokens  # e.g. "What is the waiting period?"
+    if generic:
+        subject_tokens = q_tokens
+
+    candidates = []
+    for chunk_index, chunk in enumerate(chunks):
+        for _, sentence in split_sentences(chunk):
+            sentence = " ".join(sentence.split())
+            if not 15 <= len(sentence) <= 500:
+                continue
+            match = PATTERNS[value_type].search(sentence)
+            if not match:
+                continue
+            sentence_tokens = content_tokens(sentence)
+            score = len(subject_tokens & sentence_tokens) / len(subject_tokens)
+            if score < 1.0:
+                # A sentence that doesn't mention every subject word is about something else
+                score *= 0.5
+            elif not generic and not (q_tokens & cue_tokens) <= sentence_tokens:
+                # Subject matches but the value-type wording differs; still a good candidate
+                score *= 0.85
+            candidates.append((score, sentence, match.group(0), chunk_index))
+
+    if not candidates:
+        return None
+    candidates.sort(key=lambda c: c[0], reverse=True)
+    score, sentence, value, chunk_index = candidates[0]
+    # Close runner-up with a different value means the lookup is ambiguous
+    ambiguous = False
+    for other_score, _, other_value, _ in candidates[1:]:
+        if score - other_score > 0.1:
+            break
+        if other_value.lower() != value.lower():
+            ambiguous = True
+            score *= 0.5
+            break
+
+    return ExtractiveAnswer(
+        answer=sentence,
+        value=value,
+        value_type=value_type,
+        confidence=round(score, 3),
+        chunk_index=chunk_index,
+        ambiguous=ambiguous,
+    )
+
+
+def try_fast_answer(question: str, chunks: List[str], threshold: float = None) -> Optional[ExtractiveAnswer]:
+    """Extractive answer if confident enough to skip the LLM, else None (and the caller falls through)."""
+    threshold = EXTRACTIVE_CONFIDENCE_THRESHOLD if threshold is None else threshold
+    _stats["attempts"] += 1
+    result = extract_answer(question, chunks)
+    if result is None:
+        _stats["skipped"] += 1
+        return None
+    if result.ambiguous or result.confidence < threshold:
+        _stats["fell_through"] += 1
+        return None
+    _stats["answered"] += 1
+    print(f"[extractive] Fast path answered ({result.value_type}={result.value!r}, confidence={result.confidence}).")
+    return result
+
+
+def extractive_status() -> dict:
+    hit_rate = _stats["answered"] / _stats["attempts"] if _stats["attempts"] else 0.0
+    return {**_stats, "hit_rate": round(hit_rate, 3), "threshold": EXTRACTIVE_CONFIDENCE_THRESHOLD}
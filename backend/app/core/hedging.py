@@ -0,0 +1,142 @@
+import asyncio
+import os
+import time
+from collections import defaultdict, deque
+from typing import Any, Awaitable, Callable
+
+# Hedging is opt-in: it trades extra LLM calls for a shorter latency tail.
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "false").lower() in ("1", "true", "yes")
+# Model for the hedge call; empty means a second request to the same model (another replica).
+LLM_HEDGE_SECONDARY_MODEL = os.getenv("LLM_HEDGE_SECONDARY_MODEL", "")
+# Hedge after the primary's observed p95 latency; this delay is used until enough samples exist.
+LLM_HEDGE_DEFAULT_DELAY = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY", "4.0"))
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "0.5"))
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "0.95"))
+# At most this fraction of calls may start a hedge.
+LLM_HEDGE_BUDGET = float(os.getenv("LLM_HEDGE_BUDGET", "0.1"))
+
+_MIN_SAMPLES = 20
+
+
+class LatencyTracker:
+    """Rolling window of call latencies per "call_site:model" key."""
+
+    def __init__(self, window: int = 200):
+        self._samples = defaultdict(lambda: deque(maxlen=window))
+
+    def record(self, key: str, seconds: float):
+        self._samples[key].append(seconds)
+
+    def percentile(self, key: str, q: float):
+        samples = self._samples.get(key)
+        if not samples or len(samples) < _MIN_SAMPLES:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class Hedger:
+    """
+    Runs a call on the primary model and, if it has not finished after the
+    primary's p95 latency, starts the same call on the secondary model. The first
+    valid result wins and the other call is cancelled. If one call fails the other
+    is still awaited; when both fail the primary's error is raised.
+    """
+
+    def __init__(self, enabled: bool = LLM_HEDGE_ENABLED, secondary_model: str = LLM_HEDGE_SECONDARY_MODEL,
+                 default_delay: float = LLM_HEDGE_DEFAULT_DELAY, min_delay: float = LLM_HEDGE_MIN_DELAY,
+                 percentile: float = LLM_HEDGE_PERCENTILE, budget: float = LLM_HEDGE_BUDGET):
+        self.enabled = enabled
+        self.secondary_model = secondary_model
+        self.default_delay = default_delay
+        self.min_delay = min_delay
+        self.percentile = percentile
+        self.budget = budget
+        self.latencies = LatencyTracker()
+        self.stats = {
+            "calls": 0,
+            "hedged": 0,
+            "hedge_wins": 0,
+            "budget_skipped": 0,
+            "estimated_latency_saved_seconds": 0.0,
+        }
+
+    def hedge_delay(self, key: str) -> float:
+        observed = self.latencies.percentile(key, self.percentile)
+        return max(self.min_delay, observed if observed is not None else self.default_delay)
+
+    def _within_budget(self) -> bool:
+        return self.stats["hedged"] + 1 <= self.budget * self.stats["calls"]
+
+    async def _timed(self, name: str, model: str, call: Callable[[str], Awaitable[Any]]):
+        started = time.monotonic()
+        try:
+            result = await call(model)
+        except asyncio.CancelledError:
+            # A hedge loser is cut short; its true latency is at least this long. Leaving
+            # it out would drop exactly the slow calls and pull p95/p99 down.
+            self.latencies.record(f"{name}:{model}", time.monotonic() - started)
+            raise
+        self.latencies.record(f"{name}:{model}", time.monotonic() - started)
+        return result
+
+    async def call(self, name: str, primary_model: str, call: Callable[[str], Awaitable[Any]],
+                   is_valid: Callable[[Any], bool] = lambda result: result is not None) -> Any:
+        """`name` identifies the call site, so each prompt gets its own latency profile."""
+        self.stats["calls"] += 1
+        if not self.enabled:
+            return await self._timed(name, primary_model, call)
+
+        started = time.monotonic()
+        delay = self.hedge_delay(f"{name}:{primary_model}")
+        primary = asyncio.ensure_future(self._timed(name, primary_model, call))
+        secondary = None
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if done:
+                return primary.result()
+            if not self._within_budget():
+                self.stats["budget_skipped"] += 1
+                return await primary
+
+            secondary_model = self.secondary_model or primary_model
+            self.stats["hedged"] += 1
+            print(f"[hedging] {name} on {primary_model} slower than {delay:.2f}s, hedging on {secondary_model}.")
+            secondary = asyncio.ensure_future(self._timed(name, secondary_model, call))
+            pending = {primary, secondary}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None and is_valid(task.result()):
+                        if task is secondary:
+                            self.stats["hedge_wins"] += 1
+                            # The loser is cancelled, so its latency is estimated from the primary's tail
+                            tail = self.latencies.percentile(f"{name}:{primary_model}", 0.99)
+                            if tail is not None:
+                                saved = max(0.0, tail - (time.monotonic() - started))
+                                self.stats["estimated_latency_saved_seconds"] += saved
+                        return task.result()
+            if primary.exception() is not None:
+                raise primary.exception()
+            return primary.result()
+        finally:
+            for task in (primary, secondary):
+                if task is not None and not task.done():
+                    task.cancel()
+
+    def status(self) -> dict:
+        calls = self.stats["calls"]
+        return {
+            **self.stats,
+            "enabled": self.enabled,
+            "secondary_model": self.secondary_model or "(same model)",
+            "estimated_latency_saved_seconds": round(self.stats["estimated_latency_saved_seconds"], 3),
+            "hedge_rate": round(self.stats["hedged"] / calls, 3) if calls else 0.0,
+        }
+
+
+hedger = Hedger()
+
+
+def hedging_status() -> dict:
+    return hedger.status()
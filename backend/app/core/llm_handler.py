@@ -5,6 +5,7 @@ from langchain_core.prompts import ChatPromptTemplate
 from pydantic import BaseModel, Field
 import json
 from dotenv import load_dotenv
+from .hedging import hedger
 load_dotenv()
 # --- Pydantic Schemas ---
 class QueryEntities(BaseModel):
@@ -36,17 +37,32 @@ class ChatTitle(BaseModel):
     title: str
 
 # --- Core Logic ---
-def get_llm(schema: BaseModel):
+STRUCTURED_MODEL = "gemini-2.5-flash"
+DIRECT_ANSWER_MODEL = "gemini-1.5-flash"
+
+# model name -> chat model; replaced by use_llm_factory (e.g. with tests/fake_llm.py's FakeLLMFactory)
+_llm_factory = None
+
+def use_llm_factory(factory):
+    """Build chat models with `factory(model_name)` instead of Gemini (None restores Gemini)."""
+    global _llm_factory
+    _llm_factory = factory
+
+def get_chat_model(model: str):
+    if _llm_factory is not None:
+        return _llm_factory(model)
     google_api_key = os.getenv("GOOGLE_API_KEY")
-    llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash", google_api_key=google_api_key, temperature=0.0)
-    return llm.with_structured_output(schema)
+    return ChatGoogleGenerativeAI(model=model, google_api_key=google_api_key, temperature=0.0)
+
+def get_llm(schema: BaseModel, model: str = STRUCTURED_MODEL):
+    return get_chat_model(model).with_structured_output(schema)
 
 def generate_chat_title(first_user_message: str) -> str:
     prompt = ChatPromptTemplate.from_messages([("system", "Generate a concise title (max 4 words) for a chat starting with this message."), ("human", "First message: '{message}'")])
     chain = prompt | get_llm(ChatTitle)
     return chain.invoke({"message": first_user_message}).title
 
-def extract_entities_from_query(query: str) -> QueryEntities:
+async def extract_entities_from_query(query: str) -> QueryEntities:
     prompt = ChatPromptTemplate.from_messages([("system", """
         You are an expert data extraction specialist for insurance claims processing. Your task is to carefully analyze user queries and extract relevant entities.
 
@@ -70,11 +86,14 @@ def extract_entities_from_query(query: str) -> QueryEntities:
            
         **IMPORTANT:** Only extract information that is explicitly mentioned in the query. Do not infer or assume details.
     """), ("human", "User Query: {user_query}")])
-    chain = prompt | get_llm(QueryEntities)
-    return chain.invoke({"user_query": query})
+    return await hedger.call(
+        "extract_entities",
+        STRUCTURED_MODEL,
+        lambda model: (prompt | get_llm(QueryEntities, model)).ainvoke({"user_query": query})
+    )
 
-def run_reasoning_pipeline(case_details: QueryEntities, context_chunks: List[dict], original_query: str) -> FinalResponse:
-    formatted_context = json.dumps(context_chunks, indent=2)
+async def run_reasoning_pipeline(case_details: QueryEntities, context_chunks: List[dict], original_query: str, policy_index: str = "") -> FinalResponse:
+    formatted_context = json.dumps(context_chunks, separators=(",", ":"))
     prompt = ChatPromptTemplate.from_messages([("system", """
         You are a world-class insurance claims specialist with expertise in policy analysis, coverage determination, and claim assessment. Your task is to analyze a user's query and the provided evidence to generate a comprehensive, structured JSON response.
 
@@ -103,6 +122,7 @@ def run_reasoning_pipeline(case_details: QueryEntities, context_chunks: List[dic
            - Carefully examine each policy clause for relevance
            - Cite ONLY clauses that directly relate to the query
            - Ensure clause IDs and source documents are accurate
+           - Take clause IDs and page numbers from the Structured Policy Index or the evidence's `clause_ids` / `page_number`; leave them empty rather than guessing
            - Do not fabricate or hallucinate evidence
            
         6. **Accuracy Requirements:**
@@ -110,19 +130,25 @@ def run_reasoning_pipeline(case_details: QueryEntities, context_chunks: List[dic
            - Do not make assumptions beyond what's explicitly stated
            - If information is insufficient, request more details
            - Ensure calculations are mathematically correct
+           - Use the precomputed limits, percentages and waiting periods from the Structured Policy Index for claim calculations
            
         7. **Response Quality:**
            - Make `conversational_answer` friendly but professional
            - Ensure `justification` is detailed and cites specific policy sections
            - Create meaningful `topic` that reflects the main subject
            - Provide clear reasoning for all decisions
-        """), ("human", "**Original User Query:**\n{original_query}\n\n**Extracted Case Details:**\n{case_details}\n\n**Retrieved Policy Clauses (Evidence):**\n{context}")])
-    chain = prompt | get_llm(FinalResponse)
-    return chain.invoke({
+        """), ("human", "**Original User Query:**\n{original_query}\n\n**Extracted Case Details:**\n{case_details}\n\n**Structured Policy Index:**\n{policy_index}\n\n**Retrieved Policy Clauses (Evidence):**\n{context}")])
+    inputs = {
         "original_query": original_query,
         "case_details": case_details.json(),
+        "policy_index": policy_index or "(none)",
         "context": formatted_context
-    })
+    }
+    return await hedger.call(
+        "reasoning_pipeline",
+        STRUCTURED_MODEL,
+        lambda model: (prompt | get_llm(FinalResponse, model)).ainvoke(inputs)
+    )
 
 # backend/app/core/llm_handler.py
 
@@ -134,10 +160,6 @@ async def get_direct_answer(question: str, context: str) -> str:
     Enhanced LLM call for accurate, context-based answers.
     Improved for better reasoning and accuracy.
     """
-    google_api_key = os.getenv("GOOGLE_API_KEY")
-    # Using a standard, non-structured output LLM for a simple string response
-    llm = ChatGoogleGenerativeAI(model="gemini-1.5-flash", google_api_key=google_api_key, temperature=0.0)
-
     prompt = ChatPromptTemplate.from_messages([
         ("system", """
             You are an expert insurance policy analyst and claims specialist. Your role is to provide accurate, evidence-based answers to insurance-related questions.
@@ -181,11 +203,15 @@ async def get_direct_answer(question: str, context: str) -> str:
         """)
     ])
     
-    chain = prompt | llm
-    
-    response = await chain.ainvoke({
-        "question": question,
-        "context": context
-    })
+    # Using a standard, non-structured output LLM for a simple string response
+    response = await hedger.call(
+        "direct_answer",
+        DIRECT_ANSWER_MODEL,
+        lambda model: (prompt | get_chat_model(model)).ainvoke({
+            "question": question,
+            "context": context
+        }),
+        is_valid=lambda response: bool(getattr(response, "content", None))
+    )
     
     return response.content
\ No newline at end of file
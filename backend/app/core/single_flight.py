@@ -0,0 +1,97 @@
+import asyncio
+import hashlib
+import re
+from typing import Any, Awaitable, Callable, Hashable
+
+
+def document_key(source: str | bytes) -> str:
+    """Stable hash for a document (its URL or raw bytes)."""
+    if isinstance(source, str):
+        source = source.strip().encode("utf-8")
+    return hashlib.sha256(source).hexdigest()
+
+
+def normalize_question(question: str) -> str:
+    """Case/whitespace/trailing punctuation insensitive form of a question."""
+    text = re.sub(r"\s+", " ", question.strip().lower())
+    return text.rstrip(" ?!.")
+
+
+class _Call:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key into one execution.
+
+    The first caller for a key starts the work in its own task; duplicates that
+    arrive while it is in flight await the same task. Exceptions propagate to
+    every waiter. A cancelled waiter only stops waiting, the shared work is
+    cancelled once no waiters are left.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: dict[Hashable, _Call] = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(fn()))
+            call.task.add_done_callback(lambda _t, k=key, c=call: self._forget(k, c))
+            self._calls[key] = call
+            self.executions += 1
+        else:
+            self.coalesced += 1
+            print(f"[single_flight:{self.name}] Coalesced duplicate request for key {key!r}.")
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        except asyncio.CancelledError:
+            if call.task.done():
+                raise
+            if call.waiters == 1:
+                # Last interested caller went away; nobody needs the result. Forget the
+                # call now so callers arriving before the task unwinds start fresh work
+                # instead of inheriting a cancellation they didn't ask for.
+                self._forget(key, call, retrieve=False)
+                call.task.cancel()
+            raise
+        finally:
+            call.waiters -= 1
+
+    def _forget(self, key: Hashable, call: _Call, retrieve: bool = True):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        # Mark the exception as retrieved when every waiter was cancelled.
+        if retrieve and not call.task.cancelled():
+            call.task.exception()
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    def stats(self) -> dict:
+        return {
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "in_flight": self.in_flight(),
+        }
+
+
+# Shared instances used by the API layer.
+document_flight = SingleFlight("document")
+question_flight = SingleFlight("question")
+
+
+def coalescing_status() -> dict:
+    return {
+        "document": document_flight.stats(),
+        "question": question_flight.stats(),
+        "coalesced_requests": document_flight.coalesced + question_flight.coalesced,
+    }
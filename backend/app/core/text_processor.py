@@ -1,6 +1,23 @@
-
+import re
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 
+# Start of a heading line: "Section 3", "4.1 Title", "2. Title" / "2) Title", or a line in
+# capitals. A wrapped line such as "24 months of cover" is not a heading.
+HEADING_START = (
+    r"[ \t]*(?:(?i:clause|section|article)[ \t]+\d"
+    r"|\d{1,2}(?:\.\d{1,3})+[.):]?[ \t]+[A-Z]"
+    r"|\d{1,2}[.):][ \t]+[A-Z]"
+    r"|[A-Z][A-Z &/,()-]{3,80}[ \t]*$)"
+)
+
+# Sentence breaks: ". " / "; " / "? " / "! " (but not after "Rs.", "No." or a leading "4."),
+# blank lines, or a newline before a heading. Other newlines are PDF line wraps and stay
+# inside the sentence.
+_SENTENCE_BREAK = re.compile(
+    r"(?<=[.;!?])(?<!\b[Rr]s\.)(?<!\bNo\.)(?<!^\d\.)(?<!^\d\d\.)\s+|\n\s*\n|\n(?=" + HEADING_START + r")",
+    re.MULTILINE,
+)
+
 def chunk_text(text: str, chunk_size: int = 1000, chunk_overlap: int = 200) -> list[str]:
     text_splitter = RecursiveCharacterTextSplitter(
         chunk_size=chunk_size,
@@ -8,4 +25,23 @@ def chunk_text(text: str, chunk_size: int = 1000, chunk_overlap: int = 200) -> l
         length_function=len
     )
     chunks = text_splitter.split_text(text)
-    return chunks
\ No newline at end of file
+    return chunks
+
+def chunk_text_with_offsets(text: str, chunk_size: int = 1000, chunk_overlap: int = 200) -> list[tuple[str, int]]:
+    """Same chunks as chunk_text, paired with each chunk's start offset in the source text."""
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        length_function=len,
+        add_start_index=True
+    )
+    documents = text_splitter.create_documents([text])
+    return [(doc.page_content, doc.metadata.get("start_index", 0)) for doc in documents]
+
+def split_sentences(text: str):
+    """(start offset, sentence) pairs, shared by the extractive fast path and the clause index."""
+    start = 0
+    for match in _SENTENCE_BREAK.finditer(text):
+        yield start, text[start:match.start()]
+        start = match.end()
+    yield start, text[start:]
@@ -1,26 +1,63 @@
 import os
+import json
 import math
+import hashlib
 import threading
-from collections import defaultdict, Counter
+import time
+from collections import defaultdict, deque, Counter
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from langchain_pinecone import PineconeVectorStore
 from langchain.docstore.document import Document
+from .circuit_breaker import CircuitBreaker, CLOSED
 
 PINECONE_INDEX_NAME = "hackrxuser1"
 EMBEDDING_MODEL_NAME = 'models/embedding-001'
 vector_store = None
-fallback_mode = False  # True when remote vector DB unavailable
+fallback_mode = False  # True when no remote vector DB is configured (missing API keys)
 _init_lock = threading.Lock()
 
+# Remote calls go through the breaker; while it is open traffic is served locally
+# and a background probe checks for recovery.
+breaker = CircuitBreaker(
+    "pinecone",
+    failure_threshold=int(os.getenv("VECTOR_BREAKER_FAILURE_THRESHOLD", "3")),
+    recovery_timeout=float(os.getenv("VECTOR_BREAKER_RECOVERY_SECONDS", "30")),
+)
+_probe_thread = None
+_replay_thread = None
+_state_lock = threading.RLock()
+
 # In-memory fallback storage: namespace -> list[Document]
 _local_store = defaultdict(list)
 
+# Writes made locally while the remote was unavailable, replayed in order on recovery.
+# Entries are ("add", namespace, texts, metadatas, ids) or ("delete", namespace, None, None, None).
+_replay_queue = deque()
+# namespace -> number of queued ops; such namespaces are served locally until reconciled
+_pending_namespaces = Counter()
+_replay_stats = {"replayed_ops": 0, "replayed_texts": 0, "replay_failures": 0, "dead_lettered_ops": 0, "follow_up_deletes": 0}
+# A queued op the remote keeps rejecting is dead-lettered after this many attempts so it
+# can't block the namespaces queued behind it.
+REPLAY_MAX_ATTEMPTS = int(os.getenv("VECTOR_REPLAY_MAX_ATTEMPTS", "5"))
+_head_attempts = 0
+_dead_letters = deque(maxlen=100)
+# Namespaces with a dead-lettered write: the remote copy is incomplete, so they stay local
+_dead_lettered_namespaces = set()
+# Namespace whose queued op is being pushed right now, and per-namespace delete counts to
+# notice a delete_namespace that raced that op
+_replay_in_flight = None
+_delete_generation = Counter()
+
+# Bumped on every write/delete so cached or coalesced answers can be keyed by content version.
+_namespace_versions = defaultdict(int)
+
 class VectorBackendUnavailable(Exception):
     pass
 
 def _init_remote_store():
     global vector_store, fallback_mode
-    if vector_store is not None or fallback_mode:
+    if vector_store is not None or fallback_mode or breaker.state != CLOSED:
+        # While the circuit is open the health probe retries initialization
         return
     google_api_key = os.getenv("GOOGLE_API_KEY")
     pinecone_api_key = os.getenv("PINECONE_API_KEY")
@@ -33,31 +70,87 @@ def _init_remote_store():
         vector_store = PineconeVectorStore.from_existing_index(index_name=PINECONE_INDEX_NAME, embedding=embeddings)
         print("[vector_db] Remote Pinecone vector store initialized.")
     except Exception as e:
-        fallback_mode = True
-        print(f"[vector_db] Remote store init failed ({e}). Falling back to in-memory store.")
+        print(f"[vector_db] Remote store init failed ({e}). Serving from in-memory store until it recovers.")
+        breaker.force_open(e)
+        _ensure_probe_thread()
 
 def get_vector_store():
+    """The remote store, or None when it is not configured or its circuit is open."""
+    with _init_lock:
+        _init_remote_store()
+    if fallback_mode or vector_store is None or breaker.state != CLOSED:
+        return None
+    return vector_store
+
+def use_vector_store(store):
+    """Swap in a store (e.g. tests/fake_vector_store.py) in place of Pinecone and reset the circuit."""
+    global vector_store, fallback_mode
+    with _state_lock:
+        vector_store = store
+        fallback_mode = store is None
+        breaker.record_success()
+
+def _remote_for(namespace: str):
+    """Route a call: the remote store if it may be used for this namespace, else None (local)."""
     with _init_lock:
         _init_remote_store()
-    if fallback_mode:
+    if fallback_mode or vector_store is None:
+        return None
+    with _state_lock:
+        if namespace in _dead_lettered_namespaces:
+            return None
+        if _pending_namespaces[namespace] or namespace == _replay_in_flight:
+            # Local writes not reconciled yet; keep this namespace local so reads see them
+            if breaker.state == CLOSED:
+                _schedule_replay()
+            return None
+    if not breaker.allow_request():
         return None
     return vector_store
 
+def _record_remote_success():
+    breaker.record_success()
+    _schedule_replay()
+
+def _record_remote_failure(error: Exception):
+    breaker.record_failure(error)
+    if breaker.state != CLOSED:
+        _ensure_probe_thread()
+
+def vector_ids(texts: list[str], metadatas: list[dict], namespace: str) -> list[str]:
+    """
+    Deterministic vector ids. A failed add may have landed some batches already; retrying
+    with the same ids overwrites them instead of storing every chunk twice.
+    """
+    ids = []
+    for position, (text, metadata) in enumerate(zip(texts, metadatas)):
+        key = json.dumps([namespace, position, text, metadata], sort_keys=True, default=str)
+        ids.append(hashlib.sha256(key.encode("utf-8")).hexdigest()[:32])
+    return ids
+
+def _add_local(texts: list[str], metadatas: list[dict], namespace: str, queue_replay: bool, ids: list[str] = None):
+    with _state_lock:
+        for t, m in zip(texts, metadatas):
+            _local_store[namespace].append(Document(page_content=t, metadata=m))
+        if queue_replay:
+            _replay_queue.append(("add", namespace, list(texts), list(metadatas), ids or vector_ids(texts, metadatas, namespace)))
+            _pending_namespaces[namespace] += 1
+
 def add_texts(texts: list[str], metadatas: list[dict], namespace: str):
-    """Add texts to remote store if available, else local fallback."""
-    global fallback_mode
-    store = get_vector_store()
+    """Add texts to remote store if available, else local fallback (queued for replay)."""
+    _namespace_versions[namespace] += 1
+    ids = vector_ids(texts, metadatas, namespace)
+    store = _remote_for(namespace)
     if store is not None:
         try:
-            store.add_texts(texts=texts, metadatas=metadatas, namespace=namespace)
+            store.add_texts(texts=texts, metadatas=metadatas, ids=ids, namespace=namespace)
+            _record_remote_success()
             return {"backend": "pinecone", "count": len(texts)}
         except Exception as e:
-            # Switch to fallback for future operations
-            fallback_mode = True
-            print(f"[vector_db] Error adding texts to Pinecone ({e}). Switching to fallback.")
+            print(f"[vector_db] Error adding texts to Pinecone ({e}). Writing locally for later replay.")
+            _record_remote_failure(e)
     # Fallback path
-    for t, m in zip(texts, metadatas):
-        _local_store[namespace].append(Document(page_content=t, metadata=m))
+    _add_local(texts, metadatas, namespace, queue_replay=not fallback_mode, ids=ids)
     return {"backend": "local", "count": len(texts)}
 
 def _score_local(query: str, doc: Document) -> float:
@@ -73,38 +166,189 @@ def _score_local(query: str, doc: Document) -> float:
 
 def query_vectors_with_scores(query: str, top_k: int = 5, namespace: str = None) -> list[tuple[Document, float]]:
     """Query remote store if available; fallback to naive local search."""
-    global fallback_mode
-    store = get_vector_store()
-    if store is not None and not fallback_mode:
+    store = _remote_for(namespace)
+    if store is not None:
         try:
-            return store.similarity_search_with_score(query, k=top_k, namespace=namespace)
+            results = store.similarity_search_with_score(query, k=top_k, namespace=namespace)
+            _record_remote_success()
+            return results
         except Exception as e:
-            fallback_mode = True
             print(f"[vector_db] Query failed on remote ({e}). Falling back to local.")
+            _record_remote_failure(e)
     # Local search
     docs = _local_store.get(namespace, [])
     scored = [(d, _score_local(query, d)) for d in docs]
     scored.sort(key=lambda x: x[1], reverse=True)
     return scored[:top_k]
 
+def namespace_version(namespace: str) -> int:
+    """Current content version of a namespace."""
+    return _namespace_versions.get(namespace, 0)
+
 def delete_namespace(namespace: str):
-    """Delete all vectors in a namespace (remote or local)."""
-    if fallback_mode or get_vector_store() is None:
+    """Delete all vectors in a namespace (remote and local)."""
+    _namespace_versions[namespace] += 1
+    with _state_lock:
+        _delete_generation[namespace] += 1
+        _dead_lettered_namespaces.discard(namespace)
         if namespace in _local_store:
             del _local_store[namespace]
             print(f"[vector_db] Deleted local namespace '{namespace}'.")
+        # Queued writes for this namespace are moot now
+        had_pending = _pending_namespaces.pop(namespace, 0)
+        if had_pending:
+            kept = [op for op in _replay_queue if op[1] != namespace]
+            _replay_queue.clear()
+            _replay_queue.extend(kept)
+    with _init_lock:
+        _init_remote_store()
+    if fallback_mode or vector_store is None:
         return
-    try:
-        store = get_vector_store()
-        if store is not None:
-            store.client.delete(delete_all=True, namespace=namespace)
+    if breaker.allow_request():
+        try:
+            vector_store.delete(delete_all=True, namespace=namespace)
+            _record_remote_success()
             print(f"Successfully deleted all vectors in namespace '{namespace}'.")
-    except Exception as e:
-        print(f"Error cleaning up namespace '{namespace}': {e}")
+            return
+        except Exception as e:
+            print(f"Error cleaning up namespace '{namespace}': {e}")
+            _record_remote_failure(e)
+    # Remote may still hold vectors from before the outage; delete them on recovery
+    with _state_lock:
+        _replay_queue.append(("delete", namespace, None, None, None))
+        _pending_namespaces[namespace] += 1
+
+# --- Recovery: health probes and write reconciliation ---
+
+def _probe_remote() -> bool:
+    """Cheap remote health check (no embedding call)."""
+    global vector_store
+    with _init_lock:
+        if vector_store is None:
+            google_api_key = os.getenv("GOOGLE_API_KEY")
+            embeddings = GoogleGenerativeAIEmbeddings(model=EMBEDDING_MODEL_NAME, google_api_key=google_api_key, task_type="retrieval_document")
+            vector_store = PineconeVectorStore.from_existing_index(index_name=PINECONE_INDEX_NAME, embedding=embeddings)
+    index = getattr(vector_store, "_index", None) or getattr(vector_store, "index", None) or vector_store
+    index.describe_index_stats()
+    return True
+
+def _probe_loop():
+    global _probe_thread
+    while True:
+        time.sleep(max(breaker.seconds_until_retry(), 0.05))
+        if breaker.state != CLOSED and breaker.allow_request():
+            try:
+                _probe_remote()
+                breaker.record_success()  # triggers replay via on_close
+            except Exception as e:
+                print(f"[vector_db] Health probe failed ({e}).")
+                breaker.record_failure(e)
+        # Exit only under the lock with the circuit closed: if it re-opens after this,
+        # _ensure_probe_thread sees no live probe and starts a new one.
+        with _state_lock:
+            if breaker.state == CLOSED:
+                if _probe_thread is threading.current_thread():
+                    _probe_thread = None
+                return
+
+def _ensure_probe_thread():
+    global _probe_thread
+    with _state_lock:
+        if _probe_thread is None or not _probe_thread.is_alive():
+            _probe_thread = threading.Thread(target=_probe_loop, name="vector-db-probe", daemon=True)
+            _probe_thread.start()
+
+def _pop_head(entry, namespace: str) -> bool:
+    """Remove a finished op from the queue head (caller holds _state_lock). False if it was dropped meanwhile."""
+    global _head_attempts
+    if not _replay_queue or _replay_queue[0] is not entry:
+        return False
+    _replay_queue.popleft()
+    _head_attempts = 0
+    _pending_namespaces[namespace] -= 1
+    if _pending_namespaces[namespace] <= 0:
+        del _pending_namespaces[namespace]
+        if namespace not in _dead_lettered_namespaces:
+            # Reconciled: reads for this namespace go remote again
+            _local_store.pop(namespace, None)
+    return True
+
+def replay_pending_writes() -> int:
+    """Push queued fallback writes/deletes to the remote in order. Returns how many ops were replayed."""
+    global _head_attempts, _replay_in_flight
+    replayed = 0
+    while True:
+        with _state_lock:
+            if not _replay_queue or vector_store is None or breaker.state != CLOSED:
+                break
+            entry = _replay_queue[0]
+            op, namespace, texts, metadatas, ids = entry
+            _replay_in_flight = namespace
+            generation = _delete_generation[namespace]
+        try:
+            if op == "add":
+                vector_store.add_texts(texts=texts, metadatas=metadatas, ids=ids, namespace=namespace)
+            else:
+                vector_store.delete(delete_all=True, namespace=namespace)
+        except Exception as e:
+            _replay_stats["replay_failures"] += 1
+            with _state_lock:
+                _replay_in_flight = None
+                _head_attempts += 1
+                give_up = _head_attempts >= REPLAY_MAX_ATTEMPTS and _replay_queue and _replay_queue[0] is entry
+                if give_up:
+                    _dead_letters.append({"op": op, "namespace": namespace, "count": len(texts or []), "error": str(e)})
+                    _replay_stats["dead_lettered_ops"] += 1
+                    _dead_lettered_namespaces.add(namespace)
+                    _pop_head(entry, namespace)
+            if give_up:
+                print(f"[vector_db] Replay of {op} for '{namespace}' failed {REPLAY_MAX_ATTEMPTS} times ({e}); dead-lettered, namespace stays local.")
+                continue
+            print(f"[vector_db] Replay of {op} for '{namespace}' failed ({e}); will retry after recovery.")
+            _record_remote_failure(e)
+            break
+        with _state_lock:
+            _replay_in_flight = None
+            raced_delete = _delete_generation[namespace] != generation
+            _pop_head(entry, namespace)
+        if op == "add" and raced_delete:
+            # delete_namespace ran while this add was in flight and the add may have landed
+            # after it; writes to the namespace were held local meanwhile, so delete again.
+            _replay_stats["follow_up_deletes"] += 1
+            try:
+                vector_store.delete(delete_all=True, namespace=namespace)
+            except Exception as e:
+                print(f"[vector_db] Follow-up delete for '{namespace}' failed ({e}); queued.")
+                with _state_lock:
+                    _replay_queue.appendleft(("delete", namespace, None, None, None))
+                    _pending_namespaces[namespace] += 1
+                _record_remote_failure(e)
+                break
+        replayed += 1
+        _replay_stats["replayed_ops"] += 1
+        _replay_stats["replayed_texts"] += len(texts or [])
+    if replayed:
+        print(f"[vector_db] Replayed {replayed} queued operation(s) to the remote store.")
+    return replayed
+
+def _schedule_replay():
+    global _replay_thread
+    with _state_lock:
+        if not _replay_queue or (_replay_thread is not None and _replay_thread.is_alive()):
+            return
+        _replay_thread = threading.Thread(target=replay_pending_writes, name="vector-db-replay", daemon=True)
+        _replay_thread.start()
+
+breaker.on_close(_schedule_replay)
 
 def backend_status() -> dict:
     return {
-        "fallback_mode": fallback_mode,
+        "fallback_mode": fallback_mode or breaker.state != CLOSED,
         "remote_initialized": vector_store is not None and not fallback_mode,
+        "circuit": breaker.status(),
+        "pending_replay": dict(_pending_namespaces),
+        "replay": dict(_replay_stats),
+        "dead_letters": len(_dead_letters),
+        "dead_lettered_namespaces": len(_dead_lettered_namespaces),
         "local_namespaces": list(_local_store.keys()),
-    }
\ No newline at end of file
+    }
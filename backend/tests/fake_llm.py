@@ -0,0 +1,66 @@
+import asyncio
+import random
+import time
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import Runnable
+
+
+class FakeLLM(Runnable):
+    """
+    Chat model stand-in with injectable latency and failures. Returns `response` as an
+    AIMessage, or an instance of the bound schema after with_structured_output().
+    """
+
+    def __init__(self, model: str, latency=0.0, response: str = "Fake answer.", failure_rate: float = 0.0,
+                 structured_responses: dict = None, schema=None, calls: list = None):
+        self.model = model
+        self.latency = latency
+        self.response = response
+        self.failure_rate = failure_rate
+        self.structured_responses = structured_responses or {}
+        self.schema = schema
+        self.calls = calls if calls is not None else []
+
+    def _delay(self) -> float:
+        return self.latency() if callable(self.latency) else self.latency
+
+    def _respond(self):
+        self.calls.append(self.model)
+        if random.random() < self.failure_rate:
+            raise RuntimeError(f"injected failure in {self.model}")
+        if self.schema is not None:
+            return self.schema(**self.structured_responses.get(self.schema.__name__, {}))
+        return AIMessage(content=self.response)
+
+    def invoke(self, input, config=None, **kwargs):
+        time.sleep(self._delay())
+        return self._respond()
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        await asyncio.sleep(self._delay())
+        return self._respond()
+
+    def with_structured_output(self, schema, **kwargs):
+        return FakeLLM(self.model, self.latency, self.response, self.failure_rate,
+                       self.structured_responses, schema=schema, calls=self.calls)
+
+
+class FakeLLMFactory:
+    """
+    Model-name -> FakeLLM factory for llm_handler.use_llm_factory. `latencies` maps a
+    model name to seconds (or a zero-argument callable for jitter); unknown models use
+    `default_latency`. Every call's model name is appended to `calls`.
+
+        factory = FakeLLMFactory({"gemini-1.5-flash": 5.0}, default_latency=0.1)
+        llm_handler.use_llm_factory(factory)
+    """
+
+    def __init__(self, latencies: dict = None, default_latency=0.0, **llm_kwargs):
+        self.latencies = latencies or {}
+        self.default_latency = default_latency
+        self.llm_kwargs = llm_kwargs
+        self.calls = []
+
+    def __call__(self, model: str) -> FakeLLM:
+        latency = self.latencies.get(model, self.default_latency)
+        return FakeLLM(model, latency, calls=self.calls, **self.llm_kwargs)
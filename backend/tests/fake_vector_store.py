@@ -0,0 +1,90 @@
+import random
+import threading
+import time
+import uuid
+from collections import defaultdict, Counter
+from langchain.docstore.document import Document
+
+
+class FakeRemoteError(Exception):
+    pass
+
+
+class FakeVectorStore:
+    """
+    In-process stand-in for the Pinecone store with injectable failures and latency,
+    for exercising the circuit breaker and write replay without network access:
+
+        store = FakeVectorStore(latency=0.2)
+        vector_db.use_vector_store(store)
+        store.down = True      # every call fails until set back to False
+        store.fail_next(2)     # the next two calls fail
+
+    Vectors are upserted by id like Pinecone (random ids when none are given). Set
+    `land_before_failure` to write that many texts of a failing add_texts first, as a
+    batched Pinecone write that fails partway does.
+    """
+
+    def __init__(self, latency: float = 0.0, failure_rate: float = 0.0, seed: int = None):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.down = False
+        self.calls = Counter()
+        self._fail_next = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.land_before_failure = 0
+        # namespace -> {id: Document}
+        self.namespaces = defaultdict(dict)
+
+    def fail_next(self, count: int = 1):
+        with self._lock:
+            self._fail_next += count
+
+    def _call(self, name: str, raise_failure: bool = True) -> bool:
+        with self._lock:
+            self.calls[name] += 1
+            fail = self.down or self._fail_next > 0 or self._random.random() < self.failure_rate
+            if self._fail_next > 0:
+                self._fail_next -= 1
+        if self.latency:
+            time.sleep(self.latency)
+        if fail and raise_failure:
+            raise FakeRemoteError(f"injected failure in {name}")
+        return fail
+
+    def add_texts(self, texts, metadatas=None, ids=None, namespace=None, **kwargs):
+        fail = self._call("add_texts", raise_failure=False)
+        metadatas = metadatas or [{}] * len(texts)
+        ids = ids or [uuid.uuid4().hex for _ in texts]
+        landed = min(self.land_before_failure, len(texts)) if fail else len(texts)
+        with self._lock:
+            for i, t, m in list(zip(ids, texts, metadatas))[:landed]:
+                self.namespaces[namespace][i] = Document(page_content=t, metadata=m)
+        if fail:
+            raise FakeRemoteError("injected failure in add_texts")
+        return ids
+
+    def documents(self, namespace) -> list:
+        with self._lock:
+            return list(self.namespaces.get(namespace, {}).values())
+
+    def similarity_search_with_score(self, query, k=4, namespace=None, **kwargs):
+        self._call("similarity_search_with_score")
+        q_tokens = set(query.lower().split())
+        scored = []
+        for doc in self.documents(namespace):
+            d_tokens = set(doc.page_content.lower().split())
+            scored.append((doc, len(q_tokens & d_tokens) / (len(q_tokens) or 1)))
+        scored.sort(key=lambda pair: pair[1], reverse=True)
+        return scored[:k]
+
+    def delete(self, ids=None, delete_all=None, namespace=None, **kwargs):
+        self._call("delete")
+        with self._lock:
+            if delete_all:
+                self.namespaces.pop(namespace, None)
+
+    def describe_index_stats(self):
+        self._call("describe_index_stats")
+        return {"namespaces": {ns: {"vector_count": len(docs)} for ns, docs in self.namespaces.items()}}
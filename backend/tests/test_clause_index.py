@@ -0,0 +1,104 @@
+import pytest
+
+from app.core import clause_index
+
+PAGES = [
+    "GENERAL CONDITIONS\n"
+    "4. Waiting Periods\n"
+    "4.1 Pre-existing Diseases\n"
+    "Expenses related to pre-existing diseases are excluded until the expiry of\n"
+    "36 months of continuous coverage after the date of inception of the first policy.\n",
+    "4.2 Specified Illnesses\n"
+    "Cataract surgery is covered after a waiting period of\n"
+    "24 months from the first policy start date.\n"
+    "5. Limits\n"
+    "5.1 Ambulance\n"
+    "Ambulance charges are payable up to a maximum of Rs. 5,000 per hospitalisation.\n"
+    "Room rent is capped at 1% of the sum insured per day.\n",
+]
+
+
+@pytest.fixture
+def doc_index():
+    return clause_index.build_document_index(PAGES, "policy.pdf")
+
+
+@pytest.fixture(autouse=True)
+def clean_indexes(monkeypatch):
+    monkeypatch.setattr(clause_index, "_indexes", type(clause_index._indexes)())
+    monkeypatch.setattr(clause_index, "_stats", {key: 0 for key in clause_index._stats})
+
+
+def test_wrapped_lines_are_not_clauses(doc_index):
+    assert sorted(doc_index["clauses"]) == ["4", "4.1", "4.2", "5", "5.1"]
+    assert doc_index["clauses"]["4.2"]["page"] == 2
+    # "36 months of continuous coverage" is body text of 4.1, not a clause of its own
+    assert "36 months of continuous coverage" in doc_index["clauses"]["4.1"]["text"]
+    assert any(h["heading"] == "GENERAL CONDITIONS" for h in doc_index["headings"])
+
+
+def test_wrapped_waiting_period_stays_one_sentence(doc_index):
+    periods = {fact["value"]: fact for fact in doc_index["waiting_periods"]}
+    assert periods["24 months"]["clause_id"] == "4.2"
+    assert periods["24 months"]["text"].startswith("Cataract surgery is covered after a waiting period of 24 months")
+    assert periods["36 months"]["clause_id"] == "4.1"
+    assert periods["36 months"]["page"] == 1
+
+
+def test_limits_and_percentages(doc_index):
+    limits = [fact["value"] for fact in doc_index["limits"]]
+    assert limits == ["Rs. 5,000"]
+    assert doc_index["limits"][0]["clause_id"] == "5.1"
+    assert [fact["value"] for fact in doc_index["percentages"]] == ["1%"]
+
+
+def test_chunk_metadata_page_and_clause_ids(doc_index):
+    text = "".join(PAGES)
+    start = text.index("Cataract surgery")
+    metadata = clause_index.chunk_metadata(doc_index, start, 60)
+    assert metadata == {"page_number": 2, "clause_ids": ["4.2"]}
+    # A chunk spanning the page break covers the end of 4.1 and the start of 4.2
+    boundary = len(PAGES[0]) - 20
+    assert clause_index.chunk_metadata(doc_index, boundary, 40)["clause_ids"] == ["4.1", "4.2"]
+    # Unpaginated documents have no page number
+    flat = clause_index.build_document_index(PAGES, "policy.docx", paginated=False)
+    assert "page_number" not in clause_index.chunk_metadata(flat, start, 60)
+
+
+def test_lookup_and_resolve_clause(doc_index):
+    clause_index.add_document("chat-1", doc_index)
+    entries = clause_index.lookup("chat-1", "What is the waiting period for cataract surgery?")
+    assert entries["waiting_periods"][0]["value"] == "24 months"
+    assert entries["clauses"][0]["clause_id"] == "4.2"
+    assert "[waiting period] 24 months" in clause_index.format_for_prompt(entries)
+
+    resolved = clause_index.resolve_clause("chat-1", "Ambulance charges are payable up to a maximum of Rs. 5,000")
+    assert resolved["clause_id"] == "5.1" and resolved["page"] == 2
+    assert clause_index.resolve_clause("chat-1", "Dental implants are not covered") is None
+
+
+def test_lookup_without_index_is_counted():
+    assert clause_index.lookup("unknown-chat", "waiting period") == {}
+    assert clause_index.index_status()["lookups_without_index"] == 1
+
+
+def test_readding_a_source_replaces_its_entries(doc_index):
+    clause_index.add_document("chat-1", doc_index)
+    clause_index.add_document("chat-1", clause_index.build_document_index(PAGES, "policy.pdf"))
+    clause_index.add_document("chat-1", clause_index.build_document_index(PAGES, "other.pdf"))
+    index = clause_index.get_index("chat-1")
+    assert len(index["clauses"]) == 2 * len(doc_index["clauses"])
+    assert len(index["waiting_periods"]) == 2 * len(doc_index["waiting_periods"])
+    assert len(index["headings"]) == 2 * len(doc_index["headings"])
+
+
+def test_least_recently_used_namespace_is_evicted(doc_index, monkeypatch):
+    monkeypatch.setattr(clause_index, "CLAUSE_INDEX_MAX_NAMESPACES", 2)
+    clause_index.add_document("chat-1", doc_index)
+    clause_index.add_document("chat-2", doc_index)
+    clause_index.get_index("chat-1")
+    clause_index.add_document("chat-3", doc_index)
+    assert clause_index.get_index("chat-2") is None
+    assert clause_index.get_index("chat-1") is not None and clause_index.get_index("chat-3") is not None
+    status = clause_index.index_status()
+    assert status["namespaces"] == 2 and status["evicted"] == 1
@@ -0,0 +1,64 @@
+import pytest
+
+from app.core import extractive
+from app.core.extractive import expected_value_type, extract_answer, try_fast_answer
+
+
+@pytest.fixture(autouse=True)
+def reset_stats(monkeypatch):
+    monkeypatch.setattr(extractive, "_stats", {key: 0 for key in extractive._stats})
+
+
+def test_subject_mismatch_scores_low():
+    chunks = ["A waiting period of 30 days applies to all illnesses. Claims are settled within 15 days."]
+    result = extract_answer("What is the waiting period for cataract?", chunks)
+    assert result is not None and result.confidence < 0.75
+    assert try_fast_answer("What is the waiting period for cataract?", chunks) is None
+
+
+def test_subject_match_is_answered():
+    chunks = ["Cataract surgery is covered after a waiting period of 24 months. Room rent is capped at 1% of sum insured."]
+    result = try_fast_answer("What is the waiting period for cataract surgery?", chunks)
+    assert result is not None
+    assert result.value == "24 months"
+    assert result.confidence >= 0.75
+
+
+def test_rupee_amount_is_not_split():
+    chunks = ["Ambulance charges are payable up to a limit of Rs. 40,000 per hospitalisation."]
+    result = extract_answer("What is the limit for ambulance charges?", chunks)
+    assert result is not None
+    assert result.value == "Rs. 40,000"
+    assert "Rs. 40,000" in result.answer
+
+
+def test_ambiguous_values_fall_through():
+    chunks = [
+        "An initial waiting period of 30 days applies from the policy start date. "
+        "A waiting period of 36 months applies to pre-existing diseases. "
+        "A waiting period of 24 months applies to specified illnesses."
+    ]
+    result = extract_answer("What is the waiting period?", chunks)
+    assert result is not None and result.ambiguous
+    assert result.confidence < 0.75
+    # Even with a permissive threshold an ambiguous lookup goes to the LLM
+    assert try_fast_answer("What is the waiting period?", chunks, threshold=0.1) is None
+    assert extractive._stats["fell_through"] == 1
+
+
+def test_claim_submission_is_skipped():
+    question = "I had a knee surgery that cost Rs. 2,00,000, how much will the policy pay?"
+    assert expected_value_type(question) is None
+    assert try_fast_answer(question, ["Knee surgery is covered up to Rs. 1,00,000."]) is None
+    assert extractive._stats["skipped"] == 1
+
+
+def test_threshold_fall_through_and_stats():
+    chunks = ["The grace period for premium payment is 30 days."]
+    question = "What is the grace period for premium payment?"
+    assert try_fast_answer(question, chunks, threshold=1.01) is None
+    result = try_fast_answer(question, chunks)
+    assert result is not None and result.value == "30 days"
+    assert extractive._stats == {"attempts": 2, "answered": 1, "fell_through": 1, "skipped": 0}
+    status = extractive.extractive_status()
+    assert status["hit_rate"] == 0.5
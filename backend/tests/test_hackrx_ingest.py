@@ -0,0 +1,80 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.api.v1 import endpoints
+from app.api.v1.endpoints import HackRxRequest, hackrx_run_submission
+from app.core import clause_index, single_flight, vector_db
+from tests.fake_vector_store import FakeVectorStore
+
+DOCUMENT_URL = "https://example.com/policy.pdf"
+PAGES = [
+    "4. WAITING PERIODS\n"
+    "4.1 Pre-existing diseases are covered after a waiting period of 36 months.\n"
+    "4.2 Specified illnesses are covered after a waiting period of 24 months.\n"
+]
+
+
+@pytest.fixture
+def store(monkeypatch):
+    fake = FakeVectorStore()
+    vector_db.use_vector_store(fake)
+    downloads = []
+
+    def download_and_chunk(document_url):
+        downloads.append(document_url)
+        chunks_with_offsets = endpoints.text_processor.chunk_text_with_offsets("".join(PAGES), chunk_size=80, chunk_overlap=0)
+        return "policy.pdf", clause_index.build_document_index(PAGES, "policy.pdf"), chunks_with_offsets
+
+    monkeypatch.setattr(endpoints, "_download_and_chunk", download_and_chunk)
+    fake.downloads = downloads
+    yield fake
+    vector_db.use_vector_store(None)
+
+
+def test_run_arriving_during_cancelled_write_does_not_duplicate_it(store, monkeypatch):
+    namespace = endpoints._document_namespace(single_flight.document_key(DOCUMENT_URL))
+    entered, release = threading.Event(), threading.Event()
+    real_add = store.add_texts
+
+    def slow_add(*args, **kwargs):
+        entered.set()
+        release.wait(2)
+        return real_add(*args, **kwargs)
+
+    monkeypatch.setattr(store, "add_texts", slow_add)
+    seen = {}
+
+    def check_namespace(*args, **kwargs):
+        seen["vectors"] = len(store.documents(namespace))
+        seen["headings"] = list(clause_index.get_index(namespace)["headings"])
+        return []
+
+    monkeypatch.setattr(vector_db, "query_vectors_with_scores", check_namespace)
+
+    async def scenario():
+        payload = HackRxRequest(documents=DOCUMENT_URL, questions=[])
+        first = asyncio.ensure_future(hackrx_run_submission(payload))
+        await asyncio.to_thread(entered.wait, 2)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+
+        # A new run for the same document arrives while the cancelled write is still running
+        second = asyncio.ensure_future(hackrx_run_submission(HackRxRequest(documents=DOCUMENT_URL, questions=["waiting period?"])))
+        await asyncio.sleep(0.05)
+        release.set()
+        response = await second
+        assert response.answers == ["I could not find relevant information in the document to answer this question."]
+
+    asyncio.run(scenario())
+    chunk_count = len(endpoints._download_and_chunk(DOCUMENT_URL)[2])
+    # The cancelled write was cleaned up before the document was ingested again: one copy
+    # of every chunk and heading, removed when the run finished
+    assert store.downloads.count(DOCUMENT_URL) == 3  # both runs and the call above
+    assert seen["vectors"] == chunk_count
+    assert len(seen["headings"]) == len(set(map(str, seen["headings"])))
+    assert store.documents(namespace) == []
+    assert clause_index.get_index(namespace) is None
+    assert not endpoints._document_refs and not endpoints._settling
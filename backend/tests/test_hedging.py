@@ -0,0 +1,42 @@
+import asyncio
+import time
+
+from app.core import llm_handler
+from app.core.hedging import Hedger
+from tests.fake_llm import FakeLLMFactory
+
+
+def test_slow_primary_fast_secondary(monkeypatch):
+    hedger = Hedger(enabled=True, secondary_model="fast-model", default_delay=0.05, min_delay=0.05, budget=1.0)
+    monkeypatch.setattr(llm_handler, "hedger", hedger)
+    factory = FakeLLMFactory({llm_handler.DIRECT_ANSWER_MODEL: 2.0, "fast-model": 0.01}, response="Thirty days.")
+    llm_handler.use_llm_factory(factory)
+    try:
+        started = time.monotonic()
+        answer = asyncio.run(llm_handler.get_direct_answer("What is the grace period?", "Grace period: thirty days."))
+        elapsed = time.monotonic() - started
+    finally:
+        llm_handler.use_llm_factory(None)
+
+    assert answer == "Thirty days."
+    assert elapsed < 1.0
+    # Only the secondary got to respond; the primary was cancelled mid-call
+    assert factory.calls == ["fast-model"]
+    assert hedger.stats["hedged"] == 1 and hedger.stats["hedge_wins"] == 1
+
+    # The cancelled primary is still recorded, as a lower bound of its latency
+    primary_samples = list(hedger.latencies._samples[f"direct_answer:{llm_handler.DIRECT_ANSWER_MODEL}"])
+    assert len(primary_samples) == 1 and primary_samples[0] >= 0.05
+
+
+def test_fast_primary_is_not_hedged():
+    hedger = Hedger(enabled=True, secondary_model="fast-model", default_delay=0.5, budget=1.0)
+    factory = FakeLLMFactory(default_latency=0.01)
+
+    async def ask(model):
+        return await factory(model).ainvoke("question")
+
+    result = asyncio.run(hedger.call("direct_answer", "primary-model", ask))
+    assert result.content == "Fake answer."
+    assert factory.calls == ["primary-model"]
+    assert hedger.stats["hedged"] == 0
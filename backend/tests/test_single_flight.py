@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+
+from app.core.single_flight import SingleFlight, normalize_question
+
+
+def test_cancelled_waiter_does_not_cancel_shared_work():
+    async def scenario():
+        flight = SingleFlight("test")
+        release = asyncio.Event()
+
+        async def work():
+            await release.wait()
+            return "answer"
+
+        first = asyncio.ensure_future(flight.do("key", work))
+        second = asyncio.ensure_future(flight.do("key", work))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        assert await second == "answer"
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        assert flight.executions == 1 and flight.coalesced == 1
+        assert flight.in_flight() == 0
+
+    asyncio.run(scenario())
+
+
+def test_last_waiter_cancels_work_and_next_caller_starts_fresh():
+    async def scenario():
+        flight = SingleFlight("test")
+        started = []
+        cancelled = asyncio.Event()
+
+        async def slow():
+            started.append("slow")
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        async def fast():
+            started.append("fast")
+            return "fresh"
+
+        only = asyncio.ensure_future(flight.do("key", slow))
+        await asyncio.sleep(0)
+        only.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await only
+        # A caller arriving before the cancelled task has unwound gets new work
+        assert await flight.do("key", fast) == "fresh"
+        await asyncio.wait_for(cancelled.wait(), 1)
+        assert started == ["slow", "fast"]
+        assert flight.executions == 2 and flight.coalesced == 0
+
+    asyncio.run(scenario())
+
+
+def test_exception_reaches_every_waiter():
+    async def scenario():
+        flight = SingleFlight("test")
+        calls = []
+
+        async def failing():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            raise ValueError("download failed")
+
+        results = await asyncio.gather(
+            *(flight.do("key", failing) for _ in range(3)), return_exceptions=True
+        )
+        assert all(isinstance(r, ValueError) for r in results)
+        assert len(calls) == 1
+        assert flight.stats() == {"executions": 1, "coalesced": 2, "in_flight": 0}
+
+    asyncio.run(scenario())
+
+
+def test_distinct_keys_are_not_coalesced():
+    async def scenario():
+        flight = SingleFlight("test")
+
+        async def work():
+            await asyncio.sleep(0.01)
+            return "done"
+
+        keys = [normalize_question(q) for q in ("What is X?", "what is x", "What is Y?")]
+        await asyncio.gather(*(flight.do(k, work) for k in keys))
+        assert flight.executions == 2 and flight.coalesced == 1
+
+    asyncio.run(scenario())
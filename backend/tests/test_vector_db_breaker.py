@@ -0,0 +1,133 @@
+import threading
+import time
+
+import pytest
+
+from app.core import vector_db
+from app.core.circuit_breaker import CLOSED, OPEN
+from tests.fake_vector_store import FakeVectorStore
+
+
+def _wait_for(condition, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return condition()
+
+
+@pytest.fixture
+def store(monkeypatch):
+    monkeypatch.setattr(vector_db.breaker, "recovery_timeout", 0.05)
+    monkeypatch.setattr(vector_db.breaker, "failure_threshold", 1)
+    fake = FakeVectorStore()
+    vector_db.use_vector_store(fake)
+    yield fake
+    fake.down = False
+    _wait_for(lambda: not vector_db._replay_queue)
+    vector_db.use_vector_store(None)
+
+
+def test_breaker_open_probe_replay(store):
+    store.down = True
+    result = vector_db.add_texts(["grace period is thirty days"], [{"page": 1}], namespace="ns-replay")
+    assert result["backend"] == "local"
+    assert vector_db.breaker.state == OPEN
+
+    # While open, reads for the namespace are served from the local copy
+    docs = vector_db.query_vectors_with_scores("grace period", namespace="ns-replay")
+    assert docs and docs[0][0].page_content == "grace period is thirty days"
+
+    store.down = False
+    assert _wait_for(lambda: vector_db.breaker.state == CLOSED and not vector_db._pending_namespaces)
+    assert store.calls["describe_index_stats"] >= 1
+    assert [d.page_content for d in store.documents("ns-replay")] == ["grace period is thirty days"]
+    assert "ns-replay" not in vector_db._local_store
+
+
+def test_failing_replay_op_is_dead_lettered(store, monkeypatch):
+    monkeypatch.setattr(vector_db, "REPLAY_MAX_ATTEMPTS", 2)
+    store.down = True
+    vector_db.add_texts(["stuck"], [{}], namespace="ns-stuck")
+    vector_db.add_texts(["behind"], [{}], namespace="ns-behind")
+    before = vector_db._replay_stats["dead_lettered_ops"]
+
+    # The probe succeeds but the replayed write keeps failing
+    real_add = store.add_texts
+
+    def add_texts(texts, metadatas=None, ids=None, namespace=None, **kwargs):
+        if namespace == "ns-stuck":
+            raise RuntimeError("rejected")
+        return real_add(texts, metadatas=metadatas, ids=ids, namespace=namespace)
+
+    monkeypatch.setattr(store, "add_texts", add_texts)
+    store.down = False
+    assert _wait_for(lambda: vector_db._replay_stats["dead_lettered_ops"] == before + 1 and not vector_db._replay_queue)
+    assert [d.page_content for d in store.documents("ns-behind")] == ["behind"]
+    # The dead-lettered namespace keeps being served locally
+    assert vector_db.query_vectors_with_scores("stuck", namespace="ns-stuck")[0][0].page_content == "stuck"
+
+    vector_db.delete_namespace("ns-stuck")
+    assert "ns-stuck" not in vector_db._dead_lettered_namespaces
+
+
+def test_delete_during_replay_issues_follow_up_delete(store, monkeypatch):
+    store.down = True
+    vector_db.add_texts(["old text"], [{}], namespace="ns-race")
+
+    entered, release = threading.Event(), threading.Event()
+    real_add = store.add_texts
+
+    def slow_add(texts, metadatas=None, ids=None, namespace=None, **kwargs):
+        entered.set()
+        release.wait(2)
+        return real_add(texts, metadatas=metadatas, ids=ids, namespace=namespace)
+
+    monkeypatch.setattr(store, "add_texts", slow_add)
+    store.down = False
+    assert entered.wait(2)
+    # The replayed add is in flight; delete the namespace, then let the add land
+    vector_db.delete_namespace("ns-race")
+    release.set()
+
+    assert _wait_for(lambda: vector_db._replay_stats["follow_up_deletes"] >= 1 and vector_db._replay_in_flight is None)
+    assert _wait_for(lambda: "ns-race" not in store.namespaces)
+
+
+def test_partial_remote_add_is_not_duplicated_on_replay(store, monkeypatch):
+    monkeypatch.setattr(vector_db.breaker, "failure_threshold", 3)
+    texts = [f"chunk {i} of the policy" for i in range(4)]
+    metas = [{"chunk": i} for i in range(4)]
+    # The first half of the batch lands, then the write fails
+    store.land_before_failure = 2
+    store.fail_next(1)
+    assert vector_db.add_texts(texts, metas, namespace="ns-partial")["backend"] == "local"
+    assert len(store.documents("ns-partial")) == 2
+
+    # A failing retry writes the same prefix again, then the replay succeeds
+    store.fail_next(1)
+    vector_db.replay_pending_writes()
+    vector_db.replay_pending_writes()
+    assert _wait_for(lambda: not vector_db._pending_namespaces)
+    assert sorted(d.page_content for d in store.documents("ns-partial")) == sorted(texts)
+
+
+def test_probe_restarts_when_circuit_reopens(store):
+    store.down = True
+    vector_db.add_texts(["first outage"], [{}], namespace="ns-probe")
+    store.down = False
+    assert _wait_for(lambda: vector_db.breaker.state == CLOSED and not vector_db._pending_namespaces)
+
+    # A probe thread that has finished but not been cleared must not block a new probe
+    finished = threading.Thread(target=lambda: None)
+    finished.start()
+    finished.join()
+    vector_db._probe_thread = finished
+
+    store.down = True
+    vector_db.add_texts(["second outage"], [{}], namespace="ns-probe")
+    assert vector_db.breaker.state == OPEN
+    assert vector_db._probe_thread is not finished and vector_db._probe_thread.is_alive()
+    store.down = False
+    assert _wait_for(lambda: vector_db.breaker.state == CLOSED and not vector_db._pending_namespaces)